@@ -1,9 +1,14 @@
 # Import SQLAlchemy components and datetime utility
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Float, Boolean
+from sqlalchemy import create_engine, event, inspect, insert, update, text, Column, Integer, String, DateTime, Text, Float, Boolean, LargeBinary, UniqueConstraint
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from contextlib import contextmanager
 from datetime import datetime
+import hashlib
 import logging
+import queue
 
 # Base class for ORM models
 Base = declarative_base()
@@ -11,6 +16,9 @@ Base = declarative_base()
 # Configure module logger
 logger = logging.getLogger(__name__)
 
+# Pending error log rows; thread-safe so worker threads and the event loop can both enqueue
+_error_queue = queue.Queue()
+
 class Application(Base):
     """ORM model for job applications table"""
     __tablename__ = 'applications'
@@ -19,10 +27,17 @@ class Application(Base):
     email = Column(String, nullable=False)          # Candidate email
     resume_text = Column(Text, nullable=False)      # Full resume text
     job_description = Column(Text, nullable=False)  # Original job description
+    resume_hash = Column(String(64), index=True)    # SHA-256 of resume_text (nullable like the migrated column)
+    job_hash = Column(String(64), index=True)       # SHA-256 of job_description
     score = Column(Float, nullable=False)           # Match score
     email_status = Column(Boolean, default=False)   # Whether an invite was sent
     created_at = Column(DateTime, default=datetime.utcnow)  # Timestamp
 
+    __table_args__ = (
+        # One row per submission; email leads, so this also serves email lookups
+        UniqueConstraint('email', 'resume_hash', 'job_hash', name='uq_app_dedupe'),
+    )
+
 class ErrorLog(Base):
     """ORM model for error logs table"""
     __tablename__ = 'error_logs'
@@ -31,15 +46,158 @@ class ErrorLog(Base):
     error_message = Column(Text, nullable=False)    # Error details
     created_at = Column(DateTime, default=datetime.utcnow)  # Timestamp
 
-# SQLite engine and session factory
-engine = create_engine('sqlite:///applications.db')    # SQLite database file
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class EmbeddingCache(Base):
+    """ORM model for cached embedding vectors keyed by text hash"""
+    __tablename__ = 'embedding_cache'
+
+    key = Column(String(64), primary_key=True)      # SHA-256 of the embedded text
+    vector = Column(LargeBinary, nullable=False)    # Raw int8 (or float32) vector bytes
+    scale = Column(Float)                           # int8 dequantization scale; NULL for float32
+    created_at = Column(DateTime, default=datetime.utcnow)  # Timestamp
+
+# SQLite engine with a pooled, thread-shareable connection set
+engine = create_engine(
+    'sqlite:///applications.db',                       # SQLite database file
+    connect_args={'check_same_thread': False},         # Allow pool reuse across threads
+    pool_size=10,
+    max_overflow=20,
+    pool_pre_ping=True,
+)
+# Keep loaded rows usable after the session that fetched them is closed
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+@event.listens_for(engine, 'connect')
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    """
+    Applies per-connection PRAGMAs once, when the pool opens a new connection.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute('PRAGMA journal_mode=WAL')       # Readers don't block the writer
+        cursor.execute('PRAGMA synchronous=NORMAL')     # fsync on checkpoint, not every commit
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.execute('PRAGMA cache_size=-65536')      # 64 MB page cache
+    finally:
+        cursor.close()
+
+@contextmanager
+def session_scope():
+    """
+    Yields a pooled session, committing on success and rolling back on error.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def content_hash(value: str) -> str:
+    """
+    Returns the hex SHA-256 digest used to index large text columns.
+    """
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+def _migrate_hash_columns():
+    """
+    Adds and backfills the hash columns on databases created before they existed.
+    """
+    columns = {col['name'] for col in inspect(engine).get_columns('applications')}
+    with engine.begin() as conn:
+        for name in ('resume_hash', 'job_hash'):
+            if name not in columns:
+                conn.execute(text(f'ALTER TABLE applications ADD COLUMN {name} VARCHAR(64)'))
+        rows = conn.execute(text(
+            'SELECT id, resume_text, job_description FROM applications '
+            'WHERE resume_hash IS NULL OR job_hash IS NULL'
+        )).all()
+        for row in rows:
+            conn.execute(
+                text('UPDATE applications SET resume_hash = :rh, job_hash = :jh WHERE id = :id'),
+                {'rh': content_hash(row.resume_text), 'jh': content_hash(row.job_description), 'id': row.id},
+            )
+    # Indexes are only created by create_all for new tables, so ensure them here
+    for index in Application.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        # The composite unique key below leads with email, so this index is redundant
+        conn.execute(text('DROP INDEX IF EXISTS ix_app_email'))
+    # Older tables lack the dedupe constraint; a unique index enforces the same rule.
+    # SQLite stores a table constraint as an unnamed autoindex, so check by columns.
+    dedupe_columns = ['email', 'resume_hash', 'job_hash']
+    inspector = inspect(engine)
+    has_dedupe_key = any(
+        uc['column_names'] == dedupe_columns
+        for uc in inspector.get_unique_constraints('applications')
+    ) or any(
+        ix['unique'] and ix['column_names'] == dedupe_columns
+        for ix in inspector.get_indexes('applications')
+    )
+    if not has_dedupe_key:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    'CREATE UNIQUE INDEX uq_app_dedupe '
+                    'ON applications (email, resume_hash, job_hash)'
+                ))
+        except IntegrityError:
+            logger.warning('Duplicate applications exist; skipping uq_app_dedupe index')
+
+def _create_resume_search_index():
+    """
+    Creates the FTS5 index over resume_text and the triggers that keep it in sync.
+    """
+    is_new = 'applications_fts' not in inspect(engine).get_table_names()
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS applications_fts "
+            "USING fts5(resume_text, content='applications', content_rowid='id')"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS applications_fts_ai AFTER INSERT ON applications BEGIN "
+            "INSERT INTO applications_fts(rowid, resume_text) VALUES (new.id, new.resume_text); "
+            "END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS applications_fts_ad AFTER DELETE ON applications BEGIN "
+            "INSERT INTO applications_fts(applications_fts, rowid, resume_text) "
+            "VALUES ('delete', old.id, old.resume_text); "
+            "END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS applications_fts_au AFTER UPDATE OF resume_text ON applications BEGIN "
+            "INSERT INTO applications_fts(applications_fts, rowid, resume_text) "
+            "VALUES ('delete', old.id, old.resume_text); "
+            "INSERT INTO applications_fts(rowid, resume_text) VALUES (new.id, new.resume_text); "
+            "END"
+        ))
+        # Index rows that were stored before the search table existed
+        if is_new:
+            conn.execute(text("INSERT INTO applications_fts(applications_fts) VALUES ('rebuild')"))
+
+def _migrate_embedding_cache():
+    """
+    Adds the quantization scale column to embedding caches created before it existed.
+    """
+    columns = {col['name'] for col in inspect(engine).get_columns('embedding_cache')}
+    if 'scale' not in columns:
+        with engine.begin() as conn:
+            conn.execute(text('ALTER TABLE embedding_cache ADD COLUMN scale FLOAT'))
 
 def init_db():
     """
     Creates database tables based on ORM models.
     """
     Base.metadata.create_all(bind=engine)
+    _migrate_hash_columns()
+    _migrate_embedding_cache()
+    try:
+        _create_resume_search_index()
+    except OperationalError:
+        logger.warning('SQLite FTS5 is unavailable; skipping resume keyword search index')
 
 def get_db():
     """
@@ -53,95 +211,187 @@ def get_db():
 
 def save_application(email: str, resume_text: str, job_description: str, score: float, email_status: bool = False):
     """
-    Inserts a new application record and commits.
+    Inserts a new application record and commits. Returns False if an identical
+    submission already exists or the insert fails.
     """
-    db = SessionLocal()
     try:
-        application = Application(
-            email=email,
-            resume_text=resume_text,
-            job_description=job_description,
-            score=score,
-            email_status=email_status
-        )
-        db.add(application)   # Stage insert
-        db.commit()           # Persist
-        return True
+        # Core insert skips the ORM unit-of-work; SQLite drops duplicates itself
+        with engine.begin() as conn:
+            result = conn.execute(sqlite_insert(Application).on_conflict_do_nothing(), {
+                'email': email,
+                'resume_text': resume_text,
+                'job_description': job_description,
+                'resume_hash': content_hash(resume_text),
+                'job_hash': content_hash(job_description),
+                'score': score,
+                'email_status': email_status,
+            })
+        return result.rowcount > 0
     except Exception as e:
-        db.rollback()         # Undo on error
         logger.exception('Error saving application')
         log_error(f'Error saving application: {e}')
         return False
-    finally:
-        db.close()            # Always close session
+
+def mark_invitation_sent(email: str, resume_text: str, job_description: str) -> bool:
+    """
+    Sets email_status on the application identified by its dedupe key.
+    """
+    try:
+        with engine.begin() as conn:
+            result = conn.execute(
+                update(Application)
+                  .where(
+                    Application.email == email,
+                    Application.resume_hash == content_hash(resume_text),
+                    Application.job_hash == content_hash(job_description)
+                  )
+                  .values(email_status=True)
+            )
+        return result.rowcount > 0
+    except Exception as e:
+        logger.exception('Error marking invitation sent')
+        log_error(f'Error marking invitation sent: {e}')
+        return False
 
 def find_application_by_text(resume_text: str):
     """
     Returns the first Application with identical resume_text.
     """
-    db = SessionLocal()
     try:
-        return db.query(Application).filter(Application.resume_text == resume_text).first()
+        with session_scope() as db:
+            return (
+                db.query(Application)
+                  .filter(Application.resume_hash == content_hash(resume_text))
+                  .first()
+            )
     except Exception as e:
         logger.exception('Error finding application by text')
         log_error(f'Error finding application by text: {e}')
         return None
-    finally:
-        db.close()
+
+def search_applications_by_keyword(query: str, limit: int = 20, raw: bool = False):
+    """
+    Returns Applications whose resume_text contains every whitespace-separated
+    keyword in query, best match first. Keywords are quoted, so terms like
+    'c++' or 'front-end' are matched literally; pass raw=True to use query as
+    FTS5 MATCH syntax instead.
+    """
+    if not raw:
+        query = ' '.join('"' + term.replace('"', '""') + '"' for term in query.split())
+    if not query:
+        return []
+    # The search index is optional and absent when SQLite lacks FTS5
+    if 'applications_fts' not in inspect(engine).get_table_names():
+        return []
+    try:
+        with session_scope() as db:
+            return (
+                db.query(Application)
+                  .from_statement(text(
+                    'SELECT a.* FROM applications a '
+                    'JOIN applications_fts f ON f.rowid = a.id '
+                    'WHERE applications_fts MATCH :query '
+                    'ORDER BY bm25(applications_fts) '
+                    'LIMIT :limit'
+                  ))
+                  .params(query=query, limit=limit)
+                  .all()
+            )
+    except Exception as e:
+        logger.exception('Error searching applications by keyword')
+        log_error(f'Error searching applications by keyword: {e}')
+        return []
 
 def find_exact_application_match(email: str, resume_text: str, job_description: str):
     """
     Returns an Application matching email, resume_text, and job_description.
     """
-    db = SessionLocal()
     try:
-        return (
-            db.query(Application)
-              .filter(
-                Application.email == email,
-                Application.resume_text == resume_text,
-                Application.job_description == job_description
-              )
-              .first()
-        )
+        with session_scope() as db:
+            return (
+                db.query(Application)
+                  .filter(
+                    Application.email == email,
+                    Application.resume_hash == content_hash(resume_text),
+                    Application.job_hash == content_hash(job_description)
+                  )
+                  .first()
+            )
     except Exception as e:
         logger.exception('Error finding exact application match')
         log_error(f'Error finding exact application match: {e}')
         return None
-    finally:
-        db.close()
 
-def update_email_status(email: str, status: bool) -> bool:
+def get_cached_embeddings(keys: list[str]) -> dict:
     """
-    Updates the email_status flag for a given candidate email.
+    Returns a mapping of key to (vector bytes, scale) for the cached keys.
     """
-    db = SessionLocal()
     try:
-        existing = db.query(Application).filter(Application.email == email).first()
-        if existing:
-            existing.email_status = status
-            db.commit()        # Persist change
-            return True
-        return False
+        with session_scope() as db:
+            rows = (
+                db.query(EmbeddingCache.key, EmbeddingCache.vector, EmbeddingCache.scale)
+                  .filter(EmbeddingCache.key.in_(keys))
+                  .all()
+            )
+            return {row.key: (row.vector, row.scale) for row in rows}
     except Exception as e:
-        db.rollback()
-        logger.exception('Error updating email status')
-        log_error(f'Error updating email status: {e}')
+        logger.exception('Error reading embedding cache')
+        log_error(f'Error reading embedding cache: {e}')
+        return {}
+
+def save_cached_embeddings(vectors: dict) -> bool:
+    """
+    Stores key to (vector bytes, scale) entries, ignoring keys that are already cached.
+    """
+    if not vectors:
+        return True
+    try:
+        with session_scope() as db:
+            db.execute(
+                sqlite_insert(EmbeddingCache)
+                  .values([
+                    {'key': key, 'vector': vector, 'scale': scale}
+                    for key, (vector, scale) in vectors.items()
+                  ])
+                  .on_conflict_do_nothing(index_elements=['key'])
+            )
+        return True
+    except Exception as e:
+        logger.exception('Error writing embedding cache')
+        log_error(f'Error writing embedding cache: {e}')
         return False
-    finally:
-        db.close()
 
 def log_error(error_message: str):
     """
-    Inserts an error log record for auditing.
+    Queues an error log record for auditing; flush_error_logs persists it.
     """
-    db = SessionLocal()
+    _error_queue.put_nowait((error_message, datetime.utcnow()))
+
+def has_pending_error_logs() -> bool:
+    """
+    Returns True if error log records are waiting to be flushed.
+    """
+    return not _error_queue.empty()
+
+def flush_error_logs() -> int:
+    """
+    Writes all queued error log records in a single transaction.
+    """
+    entries = []
+    while True:
+        try:
+            entries.append(_error_queue.get_nowait())
+        except queue.Empty:
+            break
+    if not entries:
+        return 0
     try:
-        log = ErrorLog(error_message=error_message)  # Create log entry
-        db.add(log)
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        logger.exception('Error logging error message')
-    finally:
-        db.close()
+        with engine.begin() as conn:
+            conn.execute(insert(ErrorLog), [
+                {'error_message': message, 'created_at': created_at}
+                for message, created_at in entries
+            ])
+        return len(entries)
+    except Exception:
+        logger.exception('Error logging error messages')
+        return 0
@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 from fastapi import APIRouter
-import inspect
 
 class MCPServer:
     """Minimal stub of the fastapi-mcp library used for tests."""
@@ -16,13 +15,9 @@ class MCPServer:
         def decorator(func):
             endpoint = path or func.__name__
 
-            async def endpoint_func(*args, **kwargs):
-                result = func(*args, **kwargs)
-                if inspect.isawaitable(result):
-                    result = await result
-                return result
-
-            self.router.api_route(f"/{endpoint}", methods=methods)(endpoint_func)
+            # Register the function itself so FastAPI sees its real signature;
+            # it awaits coroutine handlers and runs sync ones in its threadpool.
+            self.router.api_route(f"/{endpoint}", methods=methods)(func)
             return func
 
         return decorator
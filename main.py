@@ -2,13 +2,18 @@
 from fastapi import FastAPI, UploadFile, Form, File, HTTPException  # Web framework and request handling
 from fastapi.staticfiles import StaticFiles                        # Serving static files
 import uvicorn                        # ASGI server
+import asyncio                        # Offload blocking calls from the event loop
+from contextlib import asynccontextmanager, suppress  # App lifespan helpers
 import os                             # Operating system utilities
-import shutil                         # File operations
+import sys                            # Platform detection
+import io                             # In-memory byte streams
 import re                             # Regular expressions
+import json                           # JSON parsing
+from types import SimpleNamespace     # Mutable module-level settings holder
 import logging                        # Python logging
 import fitz                           # PyMuPDF for PDF parsing
 import docx                           # python-docx for DOCX parsing
-from openai import OpenAI             # OpenAI API client
+from openai import AsyncOpenAI, BadRequestError  # OpenAI async API client
 import numpy as np                    # Numerical computations
 import resend                         # Resend email service
 import yaml                           # YAML parsing
@@ -20,8 +25,13 @@ from database import (
     save_application,                   # Save a new application record
     find_application_by_text,           # Lookup by resume text
     find_exact_application_match,       # Lookup by email, resume, and job description
-    update_email_status,                # Update email sent status
-    log_error,                          # Log errors to DB
+    mark_invitation_sent,               # Record a sent invite on a stored application
+    log_error,                          # Queue errors for the DB
+    flush_error_logs,                   # Persist queued errors in one batch
+    has_pending_error_logs,             # Whether errors are waiting to be flushed
+    content_hash,                       # SHA-256 of a text value
+    get_cached_embeddings,              # Read cached embedding vectors
+    save_cached_embeddings,             # Store new embedding vectors
 )
 
 from fastapi_mcp import add_mcp_server  # MCP server integration
@@ -38,19 +48,61 @@ logger = logging.getLogger(__name__)
 with open('config.yaml', 'r') as cfg_file:
     config = yaml.safe_load(cfg_file)['project']  # Extract 'project' section
 
-# Initialize OpenAI client and default model
+# Initialize async OpenAI client and default model
 api_key = os.getenv('OPENAI_API_KEY')
-client = OpenAI(api_key=api_key)
+client = AsyncOpenAI(api_key=api_key)
 model_name = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+# Combined JSON-mode review state; OPENAI_JSON_MODE=0 disables it, and so does
+# the first reply showing the model does not support JSON mode
+json_review = SimpleNamespace(enabled=os.getenv('OPENAI_JSON_MODE', '1') != '0')
+embedding_model = 'text-embedding-ada-002'
+# Store new embeddings as int8 with a per-vector scale; set to 0 to keep float32
+quantize_embeddings = os.getenv('QUANTIZE_EMBEDDINGS', '1') != '0'
+
+# Configure Resend once; invitations are skipped with an error if it is missing
+resend.api_key = os.getenv('RESEND_API_KEY') or ''
+if not resend.api_key:
+    logger.warning('RESEND_API_KEY is not set; interview invitations will not be sent')
+
+# Email pattern, compiled once; requires a dotted alphabetic TLD
+EMAIL_PATTERN = re.compile(r'[\w.-]+@[\w.-]+\.[A-Za-z]{2,}', re.ASCII)
 
 # Ensure database tables exist
 init_db()
 
+# Seconds between batched error log writes
+ERROR_FLUSH_INTERVAL = 0.5
+
+async def write_error_logs():
+    """
+    Background task that periodically persists queued error logs in batches.
+    """
+    while True:
+        await asyncio.sleep(ERROR_FLUSH_INTERVAL)
+        if has_pending_error_logs():       # Skip the thread hop when nothing is queued
+            await asyncio.to_thread(flush_error_logs)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Runs the batched error log writer for the lifetime of the app, then flushes
+    anything still queued.
+    """
+    task = asyncio.create_task(write_error_logs())
+    try:
+        yield
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+        await asyncio.to_thread(flush_error_logs)
+
 # Create FastAPI application instance
 app = FastAPI(
     title='Job Application Processor API',
     description='API for processing job applications with ChatGPT summaries and OpenAI embeddings.',
     version=config['version'],               # Use version from config
+    lifespan=lifespan,                       # Start/stop background error log writer
 )
 
 
@@ -65,21 +117,19 @@ mcp = add_mcp_server(
     describe_full_response_schema=False,     # Don't include full schemas
 )
 
-# Define MCP tool: extract text from resume files
-@mcp.tool()
-def extract_resume_text(file_path: str) -> str:
+def extract_resume_bytes(data: bytes, filename: str) -> str:
     """
-    Extracts text from PDF or DOCX files at the given path.
+    Extracts text from in-memory PDF or DOCX content, using filename for the format.
     """
     try:
         # PDF: use PyMuPDF
-        if file_path.endswith('.pdf'):
-            with fitz.open(file_path) as doc:
-                text = '\n'.join([page.get_text('text') for page in doc])
+        if filename.lower().endswith('.pdf'):
+            with fitz.open(stream=data, filetype='pdf') as doc:
+                text = '\n'.join(page.get_text('text', sort=False) for page in doc)
         # DOCX: use python-docx
-        elif file_path.endswith('.docx'):
-            doc = docx.Document(file_path)
-            text = '\n'.join([para.text for para in doc.paragraphs])
+        elif filename.lower().endswith('.docx'):
+            doc = docx.Document(io.BytesIO(data))
+            text = '\n'.join(para.text for para in doc.paragraphs)
         else:
             # Unsupported format
             raise ValueError('Unsupported file format. Upload PDF or DOCX.')
@@ -90,9 +140,24 @@ def extract_resume_text(file_path: str) -> str:
         log_error(f'Error extracting resume text: {e}')  # Log to DB
         raise
 
+# Define MCP tool: extract text from resume files
+@mcp.tool()
+def extract_resume_text(file_path: str) -> str:
+    """
+    Extracts text from PDF or DOCX files at the given path.
+    """
+    try:
+        with open(file_path, 'rb') as resume_file:
+            data = resume_file.read()
+    except Exception as e:
+        logger.exception('Error reading resume file')
+        log_error(f'Error reading resume file: {e}')
+        raise
+    return extract_resume_bytes(data, file_path)
+
 # Define MCP tool: summarize a job description using ChatGPT
 @mcp.tool()
-def summarize_job_description(job_description_text: str) -> str:
+async def summarize_job_description(job_description_text: str) -> str:
     """
     Generates a concise summary paragraph of the provided job description.
     """
@@ -107,7 +172,7 @@ Job Description:
 {job_description_text}
 """
         # Call OpenAI ChatCompletion API
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=model_name,
             messages=[{'role': 'user', 'content': prompt}],
             temperature=0.1,              # Low randomness for consistency
@@ -119,9 +184,59 @@ Job Description:
         log_error(f'Error summarizing job description: {e}')
         return str(e)
 
+def quantize_embedding(vector: np.ndarray) -> tuple[np.ndarray, float]:
+    """
+    Converts a float32 vector to int8 values and the scale that restores them.
+    """
+    scale = float(np.abs(vector).max()) / 127
+    return np.round(vector / scale).astype(np.int8), scale
+
+def cosine_similarity(a: tuple, b: tuple) -> float:
+    """
+    Dot product of two unit embeddings given as (vector, scale) pairs.
+    """
+    (a_vec, a_scale), (b_vec, b_scale) = a, b
+    # Both int8: integer dot product with a single float rescale
+    if a_scale is not None and b_scale is not None:
+        return int(a_vec.astype(np.int32) @ b_vec.astype(np.int32)) * a_scale * b_scale
+    # Mixed or float32 entries: dequantize and compare in float32
+    if a_scale is not None:
+        a_vec = a_vec.astype(np.float32) * a_scale
+    if b_scale is not None:
+        b_vec = b_vec.astype(np.float32) * b_scale
+    return float(a_vec @ b_vec)
+
+async def get_embeddings(texts: list[str]) -> list[tuple]:
+    """
+    Returns L2-normalized embeddings as (vector, scale) pairs, calling OpenAI only
+    for cache misses. Scale is None for float32 vectors and set for int8 vectors.
+    """
+    keys = [content_hash(t) for t in texts]
+    cached = await asyncio.to_thread(get_cached_embeddings, keys)
+    vectors = {
+        key: (np.frombuffer(blob, dtype=np.int8 if scale is not None else np.float32), scale)
+        for key, (blob, scale) in cached.items()
+    }
+
+    # Embed every uncached text in a single batched request
+    missing = {key: t for key, t in zip(keys, texts) if key not in vectors}
+    if missing:
+        response = await client.embeddings.create(input=list(missing.values()), model=embedding_model)
+        fresh = {}
+        for key, item in zip(missing, response.data):
+            vec = np.asarray(item.embedding, dtype=np.float32)
+            vec /= np.linalg.norm(vec)     # Normalize once so similarity is a plain dot product
+            fresh[key] = quantize_embedding(vec) if quantize_embeddings else (vec, None)
+        vectors.update(fresh)
+        await asyncio.to_thread(
+            save_cached_embeddings,
+            {key: (vec.tobytes(), scale) for key, (vec, scale) in fresh.items()},
+        )
+    return [vectors[key] for key in keys]
+
 # Define MCP tool: compute cosine similarity of embeddings
 @mcp.tool()
-def score_similarity(resume_text: str, job_summary: str) -> float:
+async def score_similarity(resume_text: str, job_summary: str) -> float:
     """
     Calculates a similarity score (0–100) between resume and job summary.
     """
@@ -130,19 +245,11 @@ def score_similarity(resume_text: str, job_summary: str) -> float:
         if not job_summary:
             return 0.0
 
-        # Get embeddings from OpenAI
-        resume_embed = client.embeddings.create(input=resume_text, model='text-embedding-ada-002')
-        job_embed = client.embeddings.create(input=job_summary, model='text-embedding-ada-002')
+        # Get both embeddings, from the cache or one batched OpenAI request
+        resume_embedding, job_embedding = await get_embeddings([resume_text, job_summary])
 
-        # Convert to numpy arrays
-        resume_vector = np.array(resume_embed.data[0].embedding)
-        job_vector = np.array(job_embed.data[0].embedding)
-
-        # Compute cosine similarity
-        similarity = float(
-            np.dot(resume_vector, job_vector)
-            / (np.linalg.norm(resume_vector) * np.linalg.norm(job_vector))
-        )
+        # Cosine similarity of unit vectors
+        similarity = cosine_similarity(resume_embedding, job_embedding)
         # Scale to percentage
         return round(min(100.0, max(0.0, similarity * 100)), 2)
     except Exception as e:
@@ -157,7 +264,7 @@ def extract_email_address(text: str) -> str:
     Finds and returns the first email address in the given text.
     """
     try:
-        match = re.search(r'[\w\.-]+@[\w\.-]+', text)
+        match = EMAIL_PATTERN.search(text)
         return match.group(0) if match else ''
     except Exception as e:
         logger.exception('Error extracting email')
@@ -171,8 +278,7 @@ def send_email_notification(recipient_email: str, subject: str, body: str) -> bo
     Sends a plain-text email using the Resend API.
     """
     try:
-        # Configure API key
-        resend.api_key = os.getenv('RESEND_API_KEY')
+        # API key is configured at import
         if not resend.api_key:
             raise ValueError('Resend API key not found')
 
@@ -205,11 +311,8 @@ def invite_for_interview(recipient_email: str, match_score: float) -> bool:
             f'Congratulations! Based on your application review (Match Score: {match_score}%), '
             f'please schedule your interview using the link below:\n{booking_link}'
         )
-        # Send and update DB
-        if send_email_notification(recipient_email, subject, body):
-            update_email_status(recipient_email, True)
-            return True
-        return False
+        # Caller records the outcome when it saves the application
+        return send_email_notification(recipient_email, subject, body)
     except Exception as e:
         logger.exception('Error inviting for interview')
         log_error(f'Error inviting for interview: {e}')
@@ -231,7 +334,7 @@ def find_existing_application(resume_text: str):
 
 # Define MCP tool: validate document is a resume
 @mcp.tool()
-def validate_resume_document(text: str) -> bool:
+async def validate_resume_document(text: str) -> bool:
     """
     Uses ChatGPT to confirm text is formatted like a resume/CV.
     """
@@ -251,7 +354,7 @@ def validate_resume_document(text: str) -> bool:
             return len(text.split()) > 50 and keyword_hits >= 2
 
         # If no API key is configured, fall back to a simple heuristic
-        if not os.getenv('OPENAI_API_KEY'):
+        if not api_key:
             return heuristic_check()
 
         # Build validation prompt
@@ -262,7 +365,7 @@ Text:
 {text}
 """
         # Call LLM
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=model_name,
             messages=[{'role': 'user', 'content': prompt}],
             temperature=0.1,
@@ -279,6 +382,95 @@ Text:
         log_error(f'Error validating resume: {e}')
         return heuristic_check()
 
+async def review_separately(resume_text: str, job_description_text: str) -> tuple[bool, str]:
+    """
+    Runs the standalone validation and summary tools concurrently.
+    """
+    is_resume, summary = await asyncio.gather(
+        validate_resume_document(resume_text),
+        summarize_job_description(job_description_text),
+    )
+    return is_resume, summary
+
+def is_json_mode_error(error: BadRequestError) -> bool:
+    """
+    Returns True if an OpenAI 400 was caused by the response_format parameter.
+    """
+    if getattr(error, 'param', None) == 'response_format':
+        return True
+    return 'response_format' in str(getattr(error, 'message', error))
+
+async def review_application(resume_text: str, job_description_text: str) -> tuple[bool, str]:
+    """
+    Validates the resume and summarizes the job description in one ChatGPT call.
+    """
+    # Without an API key or JSON mode, the standalone tools apply their own fallbacks
+    if not api_key or not json_review.enabled:
+        return await review_separately(resume_text, job_description_text)
+    try:
+        # Build combined prompt
+        prompt = f"""
+Complete two tasks and return a JSON object with exactly these keys:
+"is_resume": true or false, whether the RESUME TEXT is a resume/CV document.
+"jd_summary": a single, concise paragraph that summarizes ALL key requirements and skills from the JOB DESCRIPTION.
+Focus on technical skills, qualifications, experience levels, and essential requirements.
+Include specific technologies, tools, education, and experience requirements.
+RESUME TEXT:
+{resume_text}
+JOB DESCRIPTION:
+{job_description_text}
+"""
+        # Call LLM in JSON mode
+        response = await client.chat.completions.create(
+            model=model_name,
+            messages=[{'role': 'user', 'content': prompt}],
+            temperature=0.1,
+            response_format={'type': 'json_object'},
+        )
+        result = json.loads(response.choices[0].message.content)
+    except BadRequestError as e:
+        if not is_json_mode_error(e):
+            # Other 400s (context length, content policy) only affect this request
+            logger.exception('Error reviewing application')
+            log_error(f'Error reviewing application: {e}')
+            return await review_separately(resume_text, job_description_text)
+        # Model rejects JSON mode; use separate calls for the rest of this process
+        json_review.enabled = False
+        logger.warning('Disabling combined review, model %s rejected JSON mode: %s', model_name, e)
+        log_error(f'Disabling combined review: {e}')
+        return await review_separately(resume_text, job_description_text)
+    except Exception as e:
+        logger.exception('Error reviewing application')
+        log_error(f'Error reviewing application: {e}')
+        return await review_separately(resume_text, job_description_text)
+
+    if not isinstance(result, dict):
+        result = {}
+    is_resume = result.get('is_resume')
+    if isinstance(is_resume, str) and is_resume.strip().lower() in ('true', 'false'):
+        is_resume = is_resume.strip().lower() == 'true'
+    summary = str(result.get('jd_summary') or '').strip()
+
+    # Fill in whichever answer the reply did not give usably
+    if not isinstance(is_resume, bool) and not summary:
+        return await review_separately(resume_text, job_description_text)
+    if not isinstance(is_resume, bool):
+        is_resume = await validate_resume_document(resume_text)
+    if not summary:
+        summary = await summarize_job_description(job_description_text)
+    return is_resume, summary
+
+def existing_application_response(email: str, existing) -> dict:
+    """
+    Builds the /applications response for a previously stored application.
+    """
+    return {
+        'email': email,
+        'score': existing.score,
+        'email_status': existing.email_status,
+        'message': 'Existing application retrieved.'
+    }
+
 # HTTP POST endpoint: process uploaded resume + job description
 @app.post('/applications', tags=['applications'])
 async def process_job_application(
@@ -286,7 +478,7 @@ async def process_job_application(
     job_description_text: str = Form(..., description='Job description to compare')
 ):
     """
-    Main workflow: extract, validate, dedupe, score, invite, and save.
+    Main workflow: extract, validate, dedupe, score, save, and invite.
     """
     try:
         # Validate file extension
@@ -295,16 +487,15 @@ async def process_job_application(
             log_error(f'Invalid file format: {file.filename}')
             raise HTTPException(status_code=400, detail='Invalid file format. Only PDF and DOCX are supported.')
 
-        # Save upload locally
-        save_dir = 'uploads'
-        os.makedirs(save_dir, exist_ok=True)
-        resume_path = os.path.join(save_dir, file.filename)
-        with open(resume_path, 'wb') as buf:
-            shutil.copyfileobj(file.file, buf)
+        # Read upload into memory; nothing is written to disk
+        data = await file.read()
+
+        # Extract resume text (parsing runs in a worker thread)
+        resume_text = await asyncio.to_thread(extract_resume_bytes, data, file.filename)
 
-        # Extract and validate resume text
-        resume_text = extract_resume_text(resume_path)
-        if not validate_resume_document(resume_text):
+        # Validate resume and summarize job description together
+        is_resume, summary = await review_application(resume_text, job_description_text)
+        if not is_resume:
             logger.error('Uploaded document is not a resume')
             log_error('Uploaded document is not a resume')
             raise HTTPException(status_code=400, detail='Uploaded document is not a resume.')
@@ -317,29 +508,44 @@ async def process_job_application(
             raise HTTPException(status_code=400, detail='No email address found in resume.')
 
         # Check for existing record
-        existing = find_exact_application_match(email, resume_text, job_description_text)
+        existing = await asyncio.to_thread(
+            find_exact_application_match, email, resume_text, job_description_text
+        )
         if existing:
-            return {
-                'email': email,
-                'score': existing.score,
-                'email_status': existing.email_status,
-                'message': 'Existing application retrieved.'
-            }
+            return existing_application_response(email, existing)
+
+        # Score against the summary
+        match_score = await score_similarity(resume_text, summary)
 
-        # Summarize and score
-        summary = summarize_job_description(job_description_text)
-        match_score = score_similarity(resume_text, summary)
+        # Reserve the row before inviting so only one concurrent duplicate sends email
+        saved = await asyncio.to_thread(
+            save_application, email, resume_text, job_description_text, match_score, False
+        )
+        if not saved:
+            # A concurrent identical submission won the insert
+            existing = await asyncio.to_thread(
+                find_exact_application_match, email, resume_text, job_description_text
+            )
+            if existing:
+                return existing_application_response(email, existing)
+            raise HTTPException(status_code=500, detail='Internal server error.')
 
         # Optionally invite candidate
         email_sent = False
         message = 'Candidate did not meet the score threshold.'
         if match_score > 80:
             message = 'Candidate passed eligibility.'
-            email_sent = invite_for_interview(email, match_score)
+            email_sent = await asyncio.to_thread(invite_for_interview, email, match_score)
             message += ' Invitation sent.' if email_sent else ' Failed to send invitation.'
-
-        # Persist result
-        save_application(email, resume_text, job_description_text, match_score, email_sent)
+            if email_sent:
+                marked = await asyncio.to_thread(
+                    mark_invitation_sent, email, resume_text, job_description_text
+                )
+                if not marked:
+                    # The email went out but the stored row still says it did not
+                    logger.error('Invitation sent to %s but email_status was not saved', email)
+                    log_error(f'Invitation sent to {email} but email_status was not saved')
+                    message += ' Invitation status could not be saved.'
 
         # Return outcome
         return {
@@ -361,4 +567,11 @@ app.mount('/', StaticFiles(directory='static', html=True), name='static')
 
 # Entry point: run with Uvicorn when invoked directly
 if __name__ == '__main__':
-    uvicorn.run(app, host='127.0.0.1', port=8000)
+    uvicorn.run(
+        'main:app',                                          # Import string so workers can load the app
+        host='127.0.0.1',
+        port=8000,
+        loop='uvloop' if sys.platform != 'win32' else 'asyncio',  # uvloop is not available on Windows
+        http='httptools',                                    # C HTTP parser instead of h11
+        workers=int(os.getenv('UVICORN_WORKERS') or os.cpu_count() or 1),
+    )